@@ -0,0 +1,227 @@
+import os
+import json
+import time
+import uuid
+import sqlite3
+from contextlib import closing
+
+
+class JobAlreadyRunningError(Exception):
+    """Raised when a job is started while another run of it still holds its lease."""
+
+
+class CheckpointStore:
+    """
+    A small SQLite journal that records how far each file of a job got
+    (downloaded, parsed, extracted or failed) together with its parsed text
+    and extracted data, so an interrupted run can resume where it stopped.
+    """
+
+    def __init__(self, db_path=None, retention_days=None):
+        # The database is shared by every worker process, so it lives on disk
+        self.db_path = db_path or os.getenv("CHECKPOINT_DB_PATH", "checkpoints.db")
+        # Jobs untouched for this long are deleted, they hold raw invoice text
+        self.retention_days = retention_days or float(os.getenv("CHECKPOINT_RETENTION_DAYS", "30"))
+        # A run renews its lease after every file, a lease this old belongs to a dead process
+        self.lease_timeout = float(os.getenv("JOB_LEASE_TIMEOUT_SECONDS", "900"))
+
+        db_folder = os.path.dirname(self.db_path)
+        if db_folder:
+            os.makedirs(db_folder, exist_ok=True)
+
+        with closing(self._connect()) as conn, conn:
+            # WAL lets readers (e.g. a download request) run while a job is writing
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS file_checkpoints (
+                    job_id TEXT NOT NULL,
+                    file_id TEXT NOT NULL,
+                    file_title TEXT,
+                    file_version TEXT,
+                    stage TEXT NOT NULL,
+                    raw_text TEXT,
+                    payload TEXT,
+                    error TEXT,
+                    updated_at REAL NOT NULL,
+                    PRIMARY KEY (job_id, file_id)
+                )
+                """
+            )
+            # One row per job that is currently being processed
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    job_id TEXT PRIMARY KEY,
+                    lease_token TEXT NOT NULL,
+                    running_since REAL NOT NULL,
+                    heartbeat_at REAL NOT NULL
+                )
+                """
+            )
+        print(f"Checkpoint store ready at: {self.db_path}")
+
+    def _connect(self):
+        # A fresh connection per call keeps the store safe to use from any thread
+        return sqlite3.connect(self.db_path, timeout=30)
+
+    def acquire_job_lease(self, job_id):
+        # Marks the job as running across every worker process and returns the lease token,
+        # or None if another run of the job is still alive.
+        # BEGIN IMMEDIATE takes the write lock up front, so two callers cannot both see the job as free.
+        now = time.time()
+        with closing(self._connect()) as conn:
+            conn.isolation_level = None
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                row = conn.execute(
+                    "SELECT heartbeat_at FROM jobs WHERE job_id = ?", (job_id,)
+                ).fetchone()
+                if row and row[0] > now - self.lease_timeout:
+                    conn.execute("ROLLBACK")
+                    return None
+
+                lease_token = uuid.uuid4().hex
+                conn.execute(
+                    "INSERT OR REPLACE INTO jobs (job_id, lease_token, running_since, heartbeat_at) VALUES (?, ?, ?, ?)",
+                    (job_id, lease_token, now, now)
+                )
+                conn.execute("COMMIT")
+                return lease_token
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def renew_job_lease(self, job_id, lease_token):
+        # Keeps a long run's lease from being taken over as stale
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "UPDATE jobs SET heartbeat_at = ? WHERE job_id = ? AND lease_token = ?",
+                (time.time(), job_id, lease_token)
+            )
+
+    def release_job_lease(self, job_id, lease_token):
+        # Only the run holding the lease can release it
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM jobs WHERE job_id = ? AND lease_token = ?",
+                (job_id, lease_token)
+            )
+
+    def get_file_checkpoint(self, job_id, file_id):
+        # Returns the last recorded checkpoint of a file as a dict, or None
+        with closing(self._connect()) as conn:
+            conn.row_factory = sqlite3.Row
+            row = conn.execute(
+                "SELECT * FROM file_checkpoints WHERE job_id = ? AND file_id = ?",
+                (job_id, file_id)
+            ).fetchone()
+
+        if row is None:
+            return None
+
+        checkpoint = dict(row)
+        checkpoint['payload'] = json.loads(checkpoint['payload']) if checkpoint['payload'] else None
+        return checkpoint
+
+    def save_stage(self, job_id, file_id, stage, file_title=None, file_version=None,
+                   raw_text=None, payload=None, error=None):
+        # Records the stage a file reached. Parsed text is kept across later stages
+        # so a failed extraction can be retried without downloading the file again.
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                """
+                INSERT INTO file_checkpoints
+                    (job_id, file_id, file_title, file_version, stage, raw_text, payload, error, updated_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (job_id, file_id) DO UPDATE SET
+                    file_title = excluded.file_title,
+                    file_version = excluded.file_version,
+                    stage = excluded.stage,
+                    raw_text = COALESCE(excluded.raw_text, file_checkpoints.raw_text),
+                    payload = excluded.payload,
+                    error = excluded.error,
+                    updated_at = excluded.updated_at
+                """,
+                (
+                    job_id,
+                    file_id,
+                    file_title,
+                    file_version,
+                    stage,
+                    raw_text,
+                    json.dumps(payload) if payload is not None else None,
+                    error,
+                    time.time()
+                )
+            )
+
+    def reset_file(self, job_id, file_id):
+        # Forgets a file's progress, e.g. when it changed in Drive since the last run
+        with closing(self._connect()) as conn, conn:
+            conn.execute(
+                "DELETE FROM file_checkpoints WHERE job_id = ? AND file_id = ?",
+                (job_id, file_id)
+            )
+
+    def prune_files(self, job_id, current_file_ids):
+        # Drops checkpoints of files that are no longer in the job's Drive folder
+        with closing(self._connect()) as conn, conn:
+            stored_ids = {
+                file_id for (file_id,) in conn.execute(
+                    "SELECT file_id FROM file_checkpoints WHERE job_id = ?", (job_id,)
+                )
+            }
+            stale_ids = stored_ids - set(current_file_ids)
+            conn.executemany(
+                "DELETE FROM file_checkpoints WHERE job_id = ? AND file_id = ?",
+                [(job_id, file_id) for file_id in stale_ids]
+            )
+        if stale_ids:
+            print(f"Removed {len(stale_ids)} checkpoint(s) of files no longer in the folder.")
+
+    def expire_jobs(self):
+        # Deletes every job whose last update is older than the retention period
+        cutoff = time.time() - self.retention_days * 24 * 60 * 60
+        with closing(self._connect()) as conn, conn:
+            deleted = conn.execute(
+                """
+                DELETE FROM file_checkpoints WHERE job_id IN (
+                    SELECT job_id FROM file_checkpoints
+                    GROUP BY job_id
+                    HAVING MAX(updated_at) < ?
+                )
+                """,
+                (cutoff,)
+            ).rowcount
+        if deleted:
+            print(f"Expired {deleted} checkpoint(s) older than {self.retention_days:g} days.")
+
+    def get_extracted_rows(self, job_id):
+        # Returns the extracted data of every finished file of a job, oldest first
+        with closing(self._connect()) as conn:
+            rows = conn.execute(
+                """
+                SELECT payload FROM file_checkpoints
+                WHERE job_id = ? AND stage = 'extracted'
+                ORDER BY rowid
+                """,
+                (job_id,)
+            ).fetchall()
+        return [json.loads(payload) for (payload,) in rows]
+
+
+if __name__ == '__main__':
+    store = CheckpointStore(db_path=os.path.join('downloads', 'checkpoints_test.db'))
+
+    store.save_stage("test-job", "file-1", "parsed", file_title="invoice.pdf", raw_text="Invoice #: INV-1")
+    store.save_stage("test-job", "file-1", "failed", file_title="invoice.pdf", error="LLM timeout")
+    print(store.get_file_checkpoint("test-job", "file-1"))
+
+    store.save_stage("test-job", "file-1", "extracted", file_title="invoice.pdf",
+                     payload={"InvoiceNumber": "INV-1", "SourceFile": "invoice.pdf"})
+    print(store.get_extracted_rows("test-job"))
+
+    lease = store.acquire_job_lease("test-job")
+    print(f"Lease taken: {lease is not None}, second run refused: {store.acquire_job_lease('test-job') is None}")
+    store.release_job_lease("test-job", lease)
@@ -33,17 +33,40 @@ class DriveAgent:
         }
 
         # Creating an instance of GoogleAuth
-        gauth = GoogleAuth(settings=settings)
+        self.gauth = GoogleAuth(settings=settings)
 
         # Performing the Authentication
-        gauth.ServiceAuth() 
+        self.gauth.ServiceAuth() 
 
         # Creating a drive instance and assigning to self
-        self.drive = GoogleDrive(gauth)
+        self.drive = GoogleDrive(self.gauth)
         
         print("Google Authentication done successfully!!")
 
 
+    def warm_up(self):
+        # Renews the shared access token before it expires. PyDrive2 keeps one HTTP connection
+        # per thread, so the GetAbout call only checks the token and warms the calling
+        # (warm-up) thread's own connection, request threads still open theirs on first use.
+        if self.gauth.access_token_expired:
+            print("Drive access token expired, re-authenticating...")
+            self.gauth.ServiceAuth()
+        self.drive.GetAbout()
+
+
+    def release(self):
+        # Closes the calling thread's Drive connection, i.e. the one warm_up opened when called
+        # from the same thread. PyDrive2 opens a new one on that thread's next API call.
+        http = getattr(self.gauth.thread_local, "http", None)
+        if http is None:
+            return
+        try:
+            http.close()
+        except Exception as e:
+            print(f"Could not close the Drive connection. Error: {e}")
+        self.gauth.thread_local.http = None
+
+
     def extract_folderid_from_link(self, folder_link):
         # Using Regex to find a match for /folders/
         match_folders = re.search(r'/folders/([a-zA-Z0-9-_]+)', folder_link)
@@ -0,0 +1,254 @@
+import io
+import os
+import sys
+import time
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from PIL import Image, ImageDraw, ImageFilter, ImageOps, ImageStat
+
+# Longest side sent to OCR, phone photos are usually 3-4x larger than Vision needs
+MAX_IMAGE_SIDE = int(os.getenv("OCR_MAX_IMAGE_SIDE", "2048"))
+JPEG_QUALITY = 85
+
+# The document crop is detected on a small copy, and only used if it is plausible
+CROP_DETECTION_SIDE = 256
+CROP_MIN_AREA_RATIO = 0.2
+CROP_MARGIN_RATIO = 0.02
+# Width of the strips along each edge that must all be background for a crop to happen
+CROP_EDGE_RATIO = 0.03
+
+
+def _flatten_transparency(image):
+    # Transparent pixels are black once the alpha channel is dropped, so the image is
+    # composited onto white paper first
+    if image.mode in ("RGBA", "LA", "PA") or "transparency" in image.info:
+        image = image.convert("RGBA")
+        background = Image.new("RGBA", image.size, (255, 255, 255, 255))
+        image = Image.alpha_composite(background, image)
+    return image
+
+
+def _has_dark_border(small, bbox, threshold):
+    # A crop is only safe for a photo of a page lying on a darker surface: every image edge and
+    # everything outside the paper's box must be darker than the paper. Scans and documents that
+    # fill the frame have bright edges, so dark banners or margins inside them are never cut off.
+    edge_x = max(1, int(small.width * CROP_EDGE_RATIO))
+    edge_y = max(1, int(small.height * CROP_EDGE_RATIO))
+    edge_strips = [
+        (0, 0, small.width, edge_y),
+        (0, small.height - edge_y, small.width, small.height),
+        (0, 0, edge_x, small.height),
+        (small.width - edge_x, 0, small.width, small.height)
+    ]
+    for strip in edge_strips:
+        if ImageStat.Stat(small.crop(strip)).mean[0] >= threshold:
+            return False
+
+    outside_mask = Image.new("L", small.size, 255)
+    ImageDraw.Draw(outside_mask).rectangle(bbox, fill=0)
+    return ImageStat.Stat(small, mask=outside_mask).mean[0] < threshold
+
+
+def _crop_to_document(image):
+    # Finds the bright paper against a darker background and crops to it with a small margin.
+    # Returns the image unchanged when no clear document boundary is found.
+    small = image.copy()
+    small.thumbnail((CROP_DETECTION_SIDE, CROP_DETECTION_SIDE))
+    small = small.filter(ImageFilter.MedianFilter(5))
+
+    threshold = ImageStat.Stat(small).mean[0]
+    paper_mask = small.point(lambda pixel: 255 if pixel > threshold else 0)
+    bbox = paper_mask.getbbox()
+    if not bbox:
+        return image
+
+    left, top, right, bottom = bbox
+    if (right - left) * (bottom - top) < CROP_MIN_AREA_RATIO * small.width * small.height:
+        return image
+
+    if not _has_dark_border(small, bbox, threshold):
+        return image
+
+    # Scaling the box back to the full image and padding it
+    scale_x = image.width / small.width
+    scale_y = image.height / small.height
+    margin_x = image.width * CROP_MARGIN_RATIO
+    margin_y = image.height * CROP_MARGIN_RATIO
+    crop_box = (
+        max(0, int(left * scale_x - margin_x)),
+        max(0, int(top * scale_y - margin_y)),
+        min(image.width, int(right * scale_x + margin_x)),
+        min(image.height, int(bottom * scale_y + margin_y))
+    )
+    return image.crop(crop_box)
+
+
+def preprocess_image(image_path, page_index=0):
+    """
+    Prepares one page of an image for OCR: fixes the EXIF rotation, flattens any
+    transparency onto white, converts to grayscale, crops to the document,
+    downscales and re-encodes it as JPEG.
+    Runs in a worker process, so it takes a path and returns plain bytes.
+    """
+    with Image.open(image_path) as image:
+        if page_index:
+            image.seek(page_index)
+
+        # For JPEGs this decodes at a reduced scale directly, which is much faster for big photos
+        image.draft("L", (MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+
+        page = ImageOps.exif_transpose(image)
+        page = _flatten_transparency(page)
+        page = page.convert("L")
+        page = _crop_to_document(page)
+        page.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE), Image.LANCZOS)
+
+        output = io.BytesIO()
+        page.save(output, format="JPEG", quality=JPEG_QUALITY, optimize=True)
+        return output.getvalue()
+
+
+class ImagePreprocessor:
+    """
+    Shrinks images before they are uploaded for OCR, using a pool of worker
+    processes so multi-page TIFFs are prepared one page per worker.
+    """
+
+    def __init__(self, max_workers=None):
+        self.max_workers = max_workers or int(os.getenv("IMAGE_WORKERS", os.cpu_count() or 1))
+        self._pool = None
+        # Requests and the warm-up thread may start or stop the pool concurrently
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self):
+        # The pool is only started the first time an image needs preprocessing
+        with self._pool_lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.max_workers)
+            return self._pool
+
+    def count_pages(self, image_path):
+        # Only reads the image headers, multi-page TIFFs report one frame per page
+        with Image.open(image_path) as image:
+            return getattr(image, "n_frames", 1)
+
+    def preprocess(self, image_path):
+        # Returns the OCR ready bytes of every page. Falls back to the original file
+        # if the image cannot be preprocessed, so OCR can still be attempted.
+        pool = None
+        try:
+            page_count = self.count_pages(image_path)
+            pool = self._get_pool()
+            pages = list(pool.map(
+                preprocess_image, [image_path] * page_count, range(page_count)
+            ))
+            print(f"Preprocessed {page_count} page(s) of {image_path} for OCR.")
+            return pages
+        except BrokenProcessPool as e:
+            # A worker died (e.g. out of memory), the pool cannot be used again so it is rebuilt
+            print(f"Image worker pool broke while processing {image_path}, restarting it. Error: {e}")
+            self._discard_pool(pool)
+            with io.open(image_path, 'rb') as image_file:
+                return [image_file.read()]
+        except Exception as e:
+            print(f"Image preprocessing failed for {image_path}, uploading it as is. Error: {e}")
+            with io.open(image_path, 'rb') as image_file:
+                return [image_file.read()]
+
+    def _discard_pool(self, pool):
+        # Drops a broken pool so the next call starts a new one
+        with self._pool_lock:
+            if pool is None or self._pool is not pool:
+                return
+            self._pool = None
+        pool.shutdown(wait=False)
+
+    def shutdown(self):
+        # Stops the worker processes, they are started again on the next preprocess call
+        with self._pool_lock:
+            pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True)
+
+
+def _run_self_checks():
+    # Synthetic regression checks for the preprocessing steps that can lose content
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as folder:
+        # Black text on a transparent background must not turn into an all black page
+        transparent = Image.new("RGBA", (1000, 1000), (0, 0, 0, 0))
+        ImageDraw.Draw(transparent).text((100, 100), "INVOICE #123", fill=(0, 0, 0, 255))
+        transparent_path = os.path.join(folder, "transparent.png")
+        transparent.save(transparent_path)
+        page = Image.open(io.BytesIO(preprocess_image(transparent_path)))
+        assert page.getextrema()[1] > 200, "Transparent image was flattened to black"
+
+        # A document filling the frame is never cropped, even with a dark header banner
+        scan = Image.new("L", (1700, 2200), 255)
+        draw = ImageDraw.Draw(scan)
+        draw.rectangle((0, 0, 1700, 260), fill=30)
+        draw.text((100, 100), "VENDOR NAME  INVOICE #123", fill=255)
+        for y in range(400, 2100, 50):
+            draw.text((100, y), "Line item description 1 x 100.00", fill=0)
+        scan_path = os.path.join(folder, "scan.png")
+        scan.save(scan_path)
+        page = Image.open(io.BytesIO(preprocess_image(scan_path)))
+        scan.thumbnail((MAX_IMAGE_SIDE, MAX_IMAGE_SIDE))
+        assert page.size == scan.size, f"Full frame document was cropped to {page.size}"
+
+        # A page photographed on a dark table is cropped to the page
+        photo = Image.new("L", (2000, 1500), 40)
+        ImageDraw.Draw(photo).rectangle((500, 200, 1500, 1300), fill=235)
+        photo_path = os.path.join(folder, "photo.png")
+        photo.save(photo_path)
+        page = Image.open(io.BytesIO(preprocess_image(photo_path)))
+        assert page.width < 1300 and page.height < 1300, f"Page on a dark background was not cropped: {page.size}"
+
+    print("Self checks passed.")
+
+
+if __name__ == '__main__':
+    # Benchmark: python -m agents.image_preprocessor [image paths...] [--ocr]
+    _run_self_checks()
+
+    args = sys.argv[1:]
+    run_ocr = "--ocr" in args
+    image_paths = [arg for arg in args if arg != "--ocr"] or [os.path.join('downloads', 'sample_invoice.png')]
+
+    preprocessor = ImagePreprocessor()
+    vision_client = None
+    if run_ocr:
+        from google.cloud import vision
+        vision_client = vision.ImageAnnotatorClient()
+
+    def time_ocr(content):
+        start = time.perf_counter()
+        vision_client.text_detection(image=vision.Image(content=content))
+        return time.perf_counter() - start
+
+    for path in image_paths:
+        if not os.path.exists(path):
+            print(f"Test file not found: {path}")
+            continue
+
+        original_size = os.path.getsize(path)
+        start = time.perf_counter()
+        pages = preprocessor.preprocess(path)
+        elapsed = time.perf_counter() - start
+        processed_size = sum(len(page) for page in pages)
+
+        print(f"\n--- {path} ---")
+        print(f"Pages: {len(pages)}")
+        print(f"Upload size: {original_size / 1024:.0f} KB -> {processed_size / 1024:.0f} KB "
+              f"({processed_size / original_size:.1%})")
+        print(f"Preprocessing time: {elapsed:.2f}s")
+
+        if run_ocr:
+            with io.open(path, 'rb') as image_file:
+                original_latency = time_ocr(image_file.read())
+            processed_latency = sum(time_ocr(page) for page in pages)
+            print(f"OCR latency: {original_latency:.2f}s -> {processed_latency:.2f}s")
+
+    preprocessor.shutdown()
@@ -1,16 +1,22 @@
 import os
 import json
 import re
+import threading
 from dotenv import load_dotenv
 
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain.prompts import PromptTemplate
 from langchain.agents import AgentExecutor, create_react_agent
 from agents.tools import convert_currency
+from agents.validation import find_invoice_issues, is_number
 
 # Load the env variables
 load_dotenv()
 
+# The fast tier is a single structured call, the agent tier is the ReAct loop with tools
+FAST_MODEL = os.getenv("LLM_FAST_MODEL", "gemini-1.5-flash-8b")
+AGENT_MODEL = os.getenv("LLM_AGENT_MODEL", "gemini-1.5-flash")
+
 class LLMAgent:
     """
     The agent responsible for interacting with the LLM (Gemini)
@@ -18,12 +24,26 @@ class LLMAgent:
     """
 
     def __init__(self):
-        # Initializing the LLM model
+        # Requests and the warm-up thread may both rebuild or drop the clients
+        self._clients_lock = threading.Lock()
+        self._create_clients()
+
+    def _create_clients(self):
+        # Initializing the LLM models, a cheap one for the first attempt and the agent's one
+        self.fast_llm = ChatGoogleGenerativeAI(
+            model=FAST_MODEL,
+            temperature=0,
+            google_api_key=os.getenv("GOOGLE_API_KEY"),
+            response_mime_type="application/json"   # JSON mode, the answer is always parseable JSON
+        )
         self.llm = ChatGoogleGenerativeAI(
-            model="gemini-1.5-flash",
+            model=AGENT_MODEL,
             temperature=0,
             google_api_key=os.getenv("GOOGLE_API_KEY")
         )
+
+        # Single call extraction chain used by the fast tier
+        self.fast_chain = self._create_fast_prompt_template() | self.fast_llm
         
         # Defining the tools the agent can use
         self.tools = [convert_currency]
@@ -43,6 +63,29 @@ class LLMAgent:
         )
         print("LangChain Agent initialized successfully with CurrencyConverterTool.")
 
+    def _ensure_clients(self):
+        # Rebuilds the LLM clients if they were released while the service was idle
+        with self._clients_lock:
+            if self.agent_executor is None:
+                self._create_clients()
+
+    def warm_up(self):
+        # Counting the tokens of a tiny prompt is free, but it authenticates and opens
+        # the connection of each model's client so the next extraction starts warm
+        self._ensure_clients()
+        with self._clients_lock:
+            llms = [self.fast_llm, self.llm]
+        for llm in llms:
+            llm.get_num_tokens("warm-up")
+
+    def release(self):
+        # Drops the LLM clients and their connections, they are rebuilt on the next extraction
+        with self._clients_lock:
+            self.fast_llm = None
+            self.llm = None
+            self.fast_chain = None
+            self.agent_executor = None
+
     def _create_prompt_template(self):
         template = """
         You are an expert AI assistant for invoice data extraction.
@@ -84,23 +127,115 @@ class LLMAgent:
         """
         return PromptTemplate.from_template(template)
 
+    def _create_fast_prompt_template(self):
+        template = """
+        You are an expert AI assistant for invoice data extraction.
+        Extract key information from the provided invoice text.
+
+        **JSON Output Rules:**
+        1. Extract these fields from the text: 
+        InvoiceNumber, InvoiceDate, VendorName, CustomerName, GSTIN, Subtotal, Tax, TotalAmount, Currency, PaymentTerms, ItemsList.
+        2. If a field is not found, use the value "N/A".
+        3. "Currency" must be the ISO 4217 code of the invoice currency, e.g. "INR" or "USD".
+        4. All numerical values in the JSON must be numbers (not strings).
+        5. The "ItemsList" field must be an array of objects. Each object must have "Description", "Quantity", "UnitPrice", and "Amount".
+        6. Respond with a single JSON object only — no extra text or explanation.
+
+        Invoice Text:
+        {input}
+        """
+        return PromptTemplate.from_template(template)
+
+    def _parse_json_answer(self, answer_str):
+        # Cleaning up any markdown formatting before parsing
+        match = re.search(r"\{.*\}", answer_str, re.DOTALL)
+        if match:
+            return json.loads(match.group(0))
+        return None
+
+    def _add_inr_total(self, invoice_data):
+        # Fills TotalAmountINR without the agent by calling the currency tool directly.
+        # Returns False if the conversion was not possible.
+        total = invoice_data.get("TotalAmount")
+        currency = str(invoice_data.get("Currency", "N/A")).upper()
+        if currency == "N/A":
+            return False
+        if currency == "INR":
+            invoice_data["TotalAmountINR"] = total
+            return True
+
+        result = convert_currency.invoke(json.dumps({"amount": total, "from_currency": currency}))
+        try:
+            invoice_data["TotalAmountINR"] = json.loads(result)["converted_amount"]
+            return True
+        except (json.JSONDecodeError, KeyError, TypeError):
+            print(f"Currency conversion failed: {result}")
+            return False
+
+    def run_fast_extraction(self, raw_text: str) -> dict:
+        # Extracts the invoice with one structured call to the fast model, no tools or agent loop.
+        print(f"Starting fast extraction with {FAST_MODEL}...")
+        try:
+            self._ensure_clients()
+            response = self.fast_chain.invoke({"input": raw_text})
+            invoice_data = json.loads(response.content)
+            if not isinstance(invoice_data, dict):
+                print("\nFast model did not return a JSON object.")
+                return {"error": "Fast model's answer is not a JSON object."}
+            return invoice_data
+
+        except Exception as e:
+            print(f"\nAn error occurred during fast extraction: {e}")
+            return {"error": str(e)}
+
+    def extract_invoice(self, raw_text: str) -> dict:
+        # Tiered extraction: try the fast single call first and only escalate to the
+        # agent when its result fails the schema and arithmetic checks.
+        fast_data = self.run_fast_extraction(raw_text)
+        fast_issues = find_invoice_issues(fast_data)
+        # Converting only a result that will be kept, the currency API has a small quota
+        if not fast_issues and not self._add_inr_total(fast_data):
+            fast_issues.append("Could not convert TotalAmount to INR.")
+
+        if not fast_issues:
+            print("Fast extraction passed validation.")
+            return fast_data
+
+        print(f"Fast extraction failed validation, escalating to the agent. Issues: {fast_issues}")
+        agent_data = self.run_agentic_extraction(raw_text)
+        agent_issues = find_invoice_issues(agent_data)
+        if "error" not in agent_data and not is_number(agent_data.get("TotalAmountINR")):
+            agent_issues.append("TotalAmountINR is missing.")
+
+        # The agent's answer is only used if it is better, a failed escalation keeps the fast result
+        agent_is_better = "error" not in agent_data and len(agent_issues) < len(fast_issues)
+        if "error" in fast_data or agent_is_better:
+            invoice_data, issues = agent_data, agent_issues
+        else:
+            print("Agent did no better than the fast extraction, keeping the fast result.")
+            invoice_data, issues = fast_data, fast_issues
+
+        # Recorded in the report so the remaining problems can be reviewed by hand
+        if issues and "error" not in invoice_data:
+            print(f"Extraction result still has issues: {issues}")
+            invoice_data["ValidationIssues"] = "; ".join(issues)
+        return invoice_data
+
     def run_agentic_extraction(self, raw_text: str) -> dict:
         # Runs the LangChain agent to perform the full extraction and tool-use workflow.
         print("Starting LangChain agent execution...")
         try:
+            self._ensure_clients()
             response = self.agent_executor.invoke({"input": raw_text})
             
             # The final answer is in the 'output' key. It's a string that needs to be parsed.
             final_answer_str = response.get("output", "{}")
             
-            # Cleaning up any markdown formatting before parsing
-            match = re.search(r"\{.*\}", final_answer_str, re.DOTALL)
-            if match:
-                json_str = match.group(0)
-                return json.loads(json_str)
-            else:
+            invoice_data = self._parse_json_answer(final_answer_str)
+            if invoice_data is None:
                 print("\nAgent did not return a valid JSON object.")
                 return {"error": "Failed to parse agent's final answer."}
+            return invoice_data
 
         except Exception as e:
             print(f"\nAn error occurred during agent execution: {e}")
@@ -135,14 +270,14 @@ if __name__ == '__main__':
     print("Initializing LLMAgent for a direct test")
     try:
         llm_agent = LLMAgent()
-        print("\nRunning agentic extraction from sample text")
-        extracted_data = llm_agent.run_agentic_extraction(sample_invoice_text)
+        print("\nRunning tiered extraction from sample text")
+        extracted_data = llm_agent.extract_invoice(sample_invoice_text)
 
         if extracted_data and "error" not in extracted_data:
             print("\nFinal Extracted Data (JSON):")
             print(json.dumps(extracted_data, indent=4))
         else:
-            print("\nAgentic extraction failed or returned an error.")
+            print("\nExtraction failed or returned an error.")
             print(f"   Result: {extracted_data}")
             
     except Exception as e:
@@ -3,6 +3,8 @@ from agents.drive_agent import DriveAgent
 from agents.parser_agent import ParserAgent
 from agents.llm_agent import LLMAgent
 from agents.excel_agent import ExcelAgent
+from agents.checkpoint_store import CheckpointStore, JobAlreadyRunningError
+from agents.tools import warm_up_http_pool, release_http_pool
 
 class Orchestrator:
     """
@@ -19,6 +21,7 @@ class Orchestrator:
             self.parser_agent = ParserAgent()
             self.llm_agent = LLMAgent()
             self.excel_agent = ExcelAgent()
+            self.checkpoint_store = CheckpointStore()
 
             print("All Agents initialized successfully")
         except Exception as e:
@@ -26,65 +29,183 @@ class Orchestrator:
             raise
         
 
-    def process_invoices_from_drive(self, folder_link):
-        # Executes the end-to-end invoice processing workflow.
+    def warm_up(self):
+        # Refreshes credentials and opens the connections the workflow needs, so the
+        # next request does not pay for them. Each agent is warmed independently.
+        print("Warming up agents...")
+        for warm_up in (self.drive_agent.warm_up, self.parser_agent.warm_up,
+                        self.llm_agent.warm_up, warm_up_http_pool):
+            try:
+                warm_up()
+            except Exception as e:
+                print(f"Warm-up step {warm_up.__qualname__} failed. Error: {e}")
+
+
+    def release(self):
+        # Frees the cached clients, connections and worker processes while the service is idle
+        print("Releasing idle agent resources...")
+        for release in (self.drive_agent.release, self.parser_agent.release,
+                        self.llm_agent.release, release_http_pool):
+            try:
+                release()
+            except Exception as e:
+                print(f"Release step {release.__qualname__} failed. Error: {e}")
+
+
+    def resolve_job_id(self, folder_link, job_id=None):
+        # A job is identified by the caller's job id, or by the Drive folder so reruns resume
+        return job_id or self.drive_agent.extract_folderid_from_link(folder_link)
+
 
-        print(f"\nStarting Invoice processing workflow for folder: {folder_link}")
+    def iter_invoice_events(self, folder_link, job_id=None):
+        # Runs the workflow file by file and yields a progress event as each stage finishes,
+        # so callers can stream partial results instead of waiting for the whole folder.
+        # Every stage is checkpointed, so a rerun of the same job skips finished work.
+        # Only one run of a job may be active, otherwise JobAlreadyRunningError is raised
+        # on the first iteration, before any work is done.
+
+        job_id = self.resolve_job_id(folder_link, job_id)
+        lease_token = self.checkpoint_store.acquire_job_lease(job_id)
+        if lease_token is None:
+            raise JobAlreadyRunningError(f"Job {job_id} is already being processed.")
+
+        try:
+            yield {"event": "job", "job_id": job_id}
+            yield from self._iter_job_events(folder_link, job_id, lease_token)
+        finally:
+            # Also runs when a streaming client disconnects and the generator is closed
+            self.checkpoint_store.release_job_lease(job_id, lease_token)
+
+
+    def _iter_job_events(self, folder_link, job_id, lease_token):
+        print(f"\nStarting Invoice processing workflow for folder: {folder_link} (job: {job_id})")
+
+        self.checkpoint_store.expire_jobs()
 
         # Using DriveAgent to get the list of files
         drive_files = self.drive_agent.list_files_in_folder(folder_link=folder_link)
+
+        # Files deleted or moved out of the folder must not show up in the job's results
+        self.checkpoint_store.prune_files(job_id, [file_obj['id'] for file_obj in drive_files])
+
         if not drive_files:
             print("No files in the Drive folder.")
-            return None
-        
-        # Looping through files, download, parse, and extract data
-        all_extracted_data = []
-        downloaded_file_paths = []
+            yield {"event": "completed", "job_id": job_id, "total_files": 0, "extracted": 0, "failed": 0}
+            return
+
         total_files = len(drive_files)
+        extracted_count = 0
+        failed_count = 0
+        yield {"event": "started", "job_id": job_id, "total_files": total_files}
 
+        # Looping through files, download, parse, and extract data
         for i, file_obj in enumerate(drive_files):
             file_title = file_obj['title']
+            file_id = file_obj['id']
+            file_version = file_obj.get('md5Checksum') or file_obj.get('modifiedDate')
+            file_info = {"file": file_title, "index": i + 1, "total_files": total_files}
+            checkpoint_fields = {"file_title": file_title, "file_version": file_version}
             print(f"\nProcessing file {i+1}/{total_files}: {file_title}")
-
-            # Download file
-            downloaded_path = self.drive_agent.download_file(file_obj=file_obj)
-            if not downloaded_path:
-                print(f"Skipping file {file_title} due to download failure")
+            self.checkpoint_store.renew_job_lease(job_id, lease_token)
+
+            checkpoint = self.checkpoint_store.get_file_checkpoint(job_id, file_id)
+            if checkpoint and checkpoint['file_version'] != file_version:
+                print(f"{file_title} changed since the last run, processing it again.")
+                self.checkpoint_store.reset_file(job_id, file_id)
+                checkpoint = None
+
+            # Files extracted by an earlier run are returned straight from the checkpoint
+            if checkpoint and checkpoint['stage'] == 'extracted':
+                print(f"Resuming: {file_title} was already extracted.")
+                extracted_count += 1
+                yield {"event": "extracted", "data": checkpoint['payload'], "resumed": True, **file_info}
                 continue
 
-            downloaded_file_paths.append(downloaded_path)
-
-            # Parsing the file to extract raw text
-            raw_text = self.parser_agent.parse_file(downloaded_path)
-            if not raw_text:
-                print(f"Skipping file {file_title} as no text could be extracted.")
-                continue
+            raw_text = checkpoint['raw_text'] if checkpoint else None
+            if raw_text:
+                print(f"Resuming: reusing the parsed text of {file_title}.")
+                yield {"event": "parsed", "resumed": True, **file_info}
+            else:
+                # Download file
+                try:
+                    downloaded_path = self.drive_agent.download_file(file_obj=file_obj)
+                except Exception as e:
+                    downloaded_path = None
+                    print(f"Download error for {file_title}: {e}")
+                if not downloaded_path:
+                    print(f"Skipping file {file_title} due to download failure")
+                    failed_count += 1
+                    self.checkpoint_store.save_stage(
+                        job_id, file_id, 'failed', error="Download failed.", **checkpoint_fields
+                    )
+                    yield {"event": "failed", "stage": "download", "error": "Download failed.", **file_info}
+                    continue
+
+                # The local copy is only needed until it is parsed. The cleanup also covers the
+                # yield, so a client disconnecting mid-stream does not leave the file behind.
+                try:
+                    self.checkpoint_store.save_stage(job_id, file_id, 'downloaded', **checkpoint_fields)
+                    yield {"event": "downloaded", **file_info}
+
+                    # Parsing the file to extract raw text
+                    raw_text = self.parser_agent.parse_file(downloaded_path)
+                finally:
+                    self._cleanup_temp_files([downloaded_path])
+                if not raw_text:
+                    print(f"Skipping file {file_title} as no text could be extracted.")
+                    failed_count += 1
+                    self.checkpoint_store.save_stage(
+                        job_id, file_id, 'failed', error="No text could be extracted.", **checkpoint_fields
+                    )
+                    yield {"event": "failed", "stage": "parse", "error": "No text could be extracted.", **file_info}
+                    continue
+
+                self.checkpoint_store.save_stage(job_id, file_id, 'parsed', raw_text=raw_text, **checkpoint_fields)
+                yield {"event": "parsed", **file_info}
 
             # Using LLM to extract structured data from the raw text
-            invoice_data = self.llm_agent.run_agentic_extraction(raw_text=raw_text)
-            if not invoice_data:
+            invoice_data = self.llm_agent.extract_invoice(raw_text=raw_text)
+            if not invoice_data or "error" in invoice_data:
                 print(f"Skipping file {file_title} as data extraction failed.")
+                failed_count += 1
+                error = (invoice_data or {}).get("error", "Data extraction failed.")
+                self.checkpoint_store.save_stage(job_id, file_id, 'failed', error=error, **checkpoint_fields)
+                yield {"event": "failed", "stage": "extract", "error": error, **file_info}
                 continue
-            
+
             # Add the Source filename for traceability
             invoice_data['SourceFile'] = file_title
-            all_extracted_data.append(invoice_data)
+            extracted_count += 1
+            self.checkpoint_store.save_stage(job_id, file_id, 'extracted', payload=invoice_data, **checkpoint_fields)
 
             print(f"Successfully processed and extracted data from {file_title}.")
+            yield {"event": "extracted", "data": invoice_data, **file_info}
+
+        yield {
+            "event": "completed",
+            "job_id": job_id,
+            "total_files": total_files,
+            "extracted": extracted_count,
+            "failed": failed_count
+        }
+
 
+    def process_invoices_from_drive(self, folder_link, job_id=None):
+        # Executes the end-to-end invoice processing workflow.
+
+        all_extracted_data = []
+        for event in self.iter_invoice_events(folder_link, job_id=job_id):
+            if event["event"] == "extracted":
+                all_extracted_data.append(event["data"])
 
         if not all_extracted_data:
             print("\nNo data was successfully extracted from any file. No Excel report was generated")
-            self._cleanup_temp_files(downloaded_file_paths)
             return None
         
         # Using excel agent to create the final report
         print(f"\nFinalizing Process...")
         final_excel_path = self.excel_agent.create_excel_from_data(all_extracted_data)
 
-        # Cleaning up the downloaded invoice files now since they are processed
-        self._cleanup_temp_files(downloaded_file_paths)
-
         if final_excel_path:
             print(f"\n🎉 Workflow complete! Final report is available at: {final_excel_path}")
         else:
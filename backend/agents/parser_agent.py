@@ -1,7 +1,14 @@
 import os
-import io
+import threading
 import pdfplumber
+import google.auth
+from concurrent.futures import ThreadPoolExecutor
+from google.auth.transport.requests import Request
 from google.cloud import vision
+from agents.image_preprocessor import ImagePreprocessor
+
+# Upper bound on concurrent Vision requests for the pages of a single multi-page image
+MAX_OCR_THREADS = 4
 
 
 class ParserAgent:
@@ -12,14 +19,58 @@ class ParserAgent:
 
     def __init__(self):
         # Initiatlizing the Google Cloud Vision Client
+        self.vision_credentials = None
+        self.vision_client = None
+        # Requests and the warm-up thread may both (re)create or close the client
+        self._vision_lock = threading.Lock()
+        self._ensure_vision_client()
+
+        # Downscales and cleans up images in worker processes before they are uploaded
+        self.image_preprocessor = ImagePreprocessor()
+
+
+    def _create_vision_client(self):
+        # Credentials are kept on the agent so they can be refreshed ahead of requests
         try:
-            self.vision_client = vision.ImageAnnotatorClient()
+            self.vision_credentials, _ = google.auth.default(
+                scopes=["https://www.googleapis.com/auth/cloud-platform"]
+            )
+            self.vision_client = vision.ImageAnnotatorClient(credentials=self.vision_credentials)
             print("Google Cloud Vision Client initialized successfully!!")
         except Exception as e:
             print(f"Failed to initialize Google Cloud Vision client. Error: {e}")
             print("   Please ensure your service account credentials are set correctly.")
             self.vision_client = None
 
+
+    def _ensure_vision_client(self):
+        # Creates the Vision client if there is none, only once even with concurrent callers
+        with self._vision_lock:
+            if not self.vision_client:
+                self._create_vision_client()
+            return self.vision_client
+
+
+    def warm_up(self):
+        # Recreates the Vision client if it was released and refreshes its token. The image
+        # worker pool is left to start with the first image, so idle workers never fork it.
+        self._ensure_vision_client()
+        with self._vision_lock:
+            if self.vision_credentials and not self.vision_credentials.valid:
+                self.vision_credentials.refresh(Request())
+
+
+    def release(self):
+        # Closes the Vision channel and stops the image workers, both are recreated on demand
+        with self._vision_lock:
+            if self.vision_client:
+                try:
+                    self.vision_client.transport.close()
+                except Exception as e:
+                    print(f"Could not close the Vision client. Error: {e}")
+                self.vision_client = None
+        self.image_preprocessor.shutdown()
+
     
     def extract_text_from_pdf(self, pdf_path):
         # Extracts text from pdf stored locally        
@@ -42,32 +93,41 @@ class ParserAgent:
             return None
         
 
+    def _detect_text(self, content):
+        # Runs Vision OCR on the bytes of a single page and returns its text
+        # Create a google vision image object from the content
+        image = vision.Image(content=content)
+
+        response = self.vision_client.text_detection(image=image)
+
+        if response.error.message:
+            raise Exception(
+                f"Cloud Vision API error: {response.error.message}"
+            )
+
+        return response.full_text_annotation.text if response.full_text_annotation else ""
+
     def extract_text_from_image(self, image_path):
         # Extracting text from Images
-        if not self.vision_client:
+        if not self._ensure_vision_client():
             print("Vision client is not available. Cannot parse image.")
             return None
         
         try:
-            # Reading the imgae in binary mode
-            with io.open(image_path, 'rb') as image_file:
-                content = image_file.read()
+            # Downscaled grayscale JPEG bytes, one entry per page of the image
+            pages = self.image_preprocessor.preprocess(image_path)
 
-            # Create a google vision image object from the content
-            image = vision.Image(content=content)
-
-            response = self.vision_client.text_detection(image=image)
-
-            if response.error.message:
-                raise Exception(
-                    f"Cloud Vision API error: {response.error.message}"
-                )
-            
-            if response.full_text_annotation:
-                return response.full_text_annotation # Return the text in the form of a string
+            # Pages of multi-page TIFFs are sent to Vision in parallel
+            if len(pages) == 1:
+                page_texts = [self._detect_text(pages[0])]
             else:
+                with ThreadPoolExecutor(max_workers=min(len(pages), MAX_OCR_THREADS)) as executor:
+                    page_texts = list(executor.map(self._detect_text, pages))
+
+            full_text = "\n".join(text for text in page_texts if text)
+            if not full_text:
                 print(f"No text found in image: {image_path}")
-                return ""
+            return full_text
             
         except Exception as e:
             print(f"Error parsing image {image_path}: {e}")
@@ -81,7 +141,7 @@ class ParserAgent:
             _, file_extension = os.path.splitext(file_path)
             file_extension = file_extension.lower()
 
-            supported_image_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff']
+            supported_image_formats = ['.png', '.jpg', '.jpeg', '.bmp', '.tiff', '.tif']
 
             if file_extension == '.pdf':
                 return self.extract_text_from_pdf(file_path)
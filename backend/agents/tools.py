@@ -7,6 +7,25 @@ from pydantic import BaseModel, ValidationError
 
 load_dotenv()
 
+CURRENCY_API_URL = "https://api.currencyapi.com"
+
+# Shared session so currency lookups reuse warm HTTPS connections
+http_session = requests.Session()
+
+
+def warm_up_http_pool():
+    # Opens a connection to the currency API ahead of the first conversion
+    try:
+        http_session.head(CURRENCY_API_URL, timeout=10)
+    except requests.exceptions.RequestException as e:
+        print(f"Could not warm up the currency API connection: {e}")
+
+
+def release_http_pool():
+    # Closes idle pooled connections, the session reconnects on its next request
+    http_session.close()
+
+
 class CurrencyInput(BaseModel):
     amount: float
     from_currency: str
@@ -41,8 +60,9 @@ def convert_currency(tool_input: str) -> str:
     print(f"Using CurrencyConverterTool: Converting {amount} {from_currency} to {to_currency}...")
 
     try:
-        response = requests.get(
-            f"https://api.currencyapi.com/v3/latest?apikey={api_key}&base_currency={from_currency}&currencies={to_currency}"
+        response = http_session.get(
+            f"{CURRENCY_API_URL}/v3/latest?apikey={api_key}&base_currency={from_currency}&currencies={to_currency}",
+            timeout=30
         )
         response.raise_for_status()
         data = response.json()
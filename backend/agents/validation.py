@@ -0,0 +1,140 @@
+REQUIRED_FIELDS = [
+    "InvoiceNumber", "InvoiceDate", "VendorName", "CustomerName", "GSTIN",
+    "Subtotal", "Tax", "TotalAmount", "Currency", "PaymentTerms", "ItemsList"
+]
+AMOUNT_FIELDS = ["Subtotal", "Tax", "TotalAmount"]
+ITEM_FIELDS = ["Description", "Quantity", "UnitPrice", "Amount"]
+
+# Absolute tolerance per rounded amount, and the most a whole check may be off by
+ROUNDING_TOLERANCE = 0.05
+MAX_ROUNDING_TOLERANCE = 1.0
+
+
+def is_number(value):
+    # bools are ints in Python, but never valid amounts
+    return isinstance(value, (int, float)) and not isinstance(value, bool)
+
+
+def _amounts_match(expected, actual, rounded_terms=1):
+    # Only allows for rounding of the printed amounts, each rounded term can be off by a few
+    # paise/cents. Misread digits are off by much more and must fail the check.
+    tolerance = min(MAX_ROUNDING_TOLERANCE, ROUNDING_TOLERANCE * rounded_terms)
+    return abs(expected - actual) <= tolerance
+
+
+def find_invoice_issues(invoice_data):
+    """
+    Checks extracted invoice data against the output schema and its own arithmetic
+    (Subtotal + Tax = TotalAmount, line items add up to the Subtotal).
+    Returns a list of human readable issues, an empty list means the data looks right.
+    """
+    if not isinstance(invoice_data, dict):
+        return ["Extraction result is not a JSON object."]
+    if "error" in invoice_data:
+        return [f"Extraction failed: {invoice_data['error']}"]
+
+    issues = []
+
+    # Schema checks
+    for field in REQUIRED_FIELDS:
+        if field not in invoice_data:
+            issues.append(f"Missing field '{field}'.")
+
+    for field in AMOUNT_FIELDS:
+        value = invoice_data.get(field, "N/A")
+        if value != "N/A" and not is_number(value):
+            issues.append(f"'{field}' is not a number: {value!r}.")
+
+    total = invoice_data.get("TotalAmount")
+    if not is_number(total):
+        issues.append("TotalAmount could not be extracted.")
+
+    items = invoice_data.get("ItemsList", "N/A")
+    if items != "N/A" and not isinstance(items, list):
+        issues.append("ItemsList is not a list.")
+        items = []
+    elif items == "N/A":
+        items = []
+
+    for i, item in enumerate(items):
+        if not isinstance(item, dict):
+            issues.append(f"Item {i+1} is not an object.")
+            continue
+        missing = [field for field in ITEM_FIELDS if field not in item]
+        if missing:
+            issues.append(f"Item {i+1} is missing {', '.join(missing)}.")
+            continue
+        quantity, unit_price, amount = item["Quantity"], item["UnitPrice"], item["Amount"]
+        if is_number(quantity) and is_number(unit_price) and is_number(amount):
+            # A UnitPrice rounded to 2 decimals is off by up to half a cent per unit
+            if not _amounts_match(amount, quantity * unit_price, rounded_terms=1 + abs(quantity) / 10):
+                issues.append(f"Item {i+1}: Quantity x UnitPrice ({quantity * unit_price}) != Amount ({amount}).")
+        elif not is_number(amount):
+            issues.append(f"Item {i+1}: Amount is not a number: {amount!r}.")
+
+    # Arithmetic checks, only where the numbers are present
+    subtotal = invoice_data.get("Subtotal")
+    tax = invoice_data.get("Tax")
+    if is_number(subtotal) and is_number(total):
+        expected_total = subtotal + (tax if is_number(tax) else 0)
+        if not _amounts_match(total, expected_total, rounded_terms=2):
+            issues.append(f"Subtotal + Tax ({expected_total}) != TotalAmount ({total}).")
+
+    item_amounts = [item["Amount"] for item in items if isinstance(item, dict) and is_number(item.get("Amount"))]
+    if item_amounts and len(item_amounts) == len(items) and is_number(subtotal):
+        if not _amounts_match(subtotal, sum(item_amounts), rounded_terms=len(item_amounts)):
+            issues.append(f"Line items ({sum(item_amounts)}) do not add up to Subtotal ({subtotal}).")
+
+    return issues
+
+
+def _run_self_checks():
+    # Regression checks for the tolerances that decide which invoices get escalated
+    def sample_invoice(**overrides):
+        invoice = {
+            "InvoiceNumber": "INV-2025-001",
+            "InvoiceDate": "2025-08-26",
+            "VendorName": "MegaCorp Solutions",
+            "CustomerName": "Global Innovations Inc.",
+            "GSTIN": "22AABCU9567R1Z5",
+            "Subtotal": 1250.00,
+            "Tax": 62.50,
+            "TotalAmount": 1312.50,
+            "Currency": "USD",
+            "PaymentTerms": "Net 30 Days",
+            "ItemsList": [
+                {"Description": "Cloud Service", "Quantity": 10, "UnitPrice": 50.00, "Amount": 500.00},
+                {"Description": "AI Consulting", "Quantity": 5, "UnitPrice": 150.00, "Amount": 750.00}
+            ]
+        }
+        invoice.update(overrides)
+        return invoice
+
+    # A clean invoice passes
+    assert find_invoice_issues(sample_invoice()) == [], "Clean invoice was flagged"
+
+    # A misread digit in the total must escalate, even though it is within 1% of the real total
+    issues = find_invoice_issues(sample_invoice(TotalAmount=1325.00))
+    assert any("TotalAmount" in issue for issue in issues), f"Misread total was accepted: {issues}"
+
+    # A missing tax is allowed when the subtotal alone matches the total
+    issues = find_invoice_issues(sample_invoice(Tax="N/A", TotalAmount=1250.00))
+    assert issues == [], f"Invoice without tax was flagged: {issues}"
+
+    # Amounts extracted as strings are schema errors
+    issues = find_invoice_issues(sample_invoice(Subtotal="1250.00"))
+    assert any("'Subtotal' is not a number" in issue for issue in issues), f"String amount was accepted: {issues}"
+
+    # Line items that do not add up to the subtotal must escalate
+    items = [
+        {"Description": "Cloud Service", "Quantity": 10, "UnitPrice": 50.00, "Amount": 500.00},
+        {"Description": "AI Consulting", "Quantity": 4, "UnitPrice": 150.00, "Amount": 600.00}
+    ]
+    issues = find_invoice_issues(sample_invoice(ItemsList=items))
+    assert any("do not add up to Subtotal" in issue for issue in issues), f"Wrong line items were accepted: {issues}"
+
+    print("Self checks passed.")
+
+
+if __name__ == '__main__':
+    _run_self_checks()
@@ -0,0 +1,77 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+
+
+class WarmupManager:
+    """
+    Keeps the orchestrator's clients warm while the service is in use and
+    releases them once it has been idle for a while. Runs as a background
+    thread inside the worker process, so no traffic leaves the machine.
+    """
+
+    def __init__(self, orchestrator, refresh_interval=None, idle_timeout=None):
+        self.orchestrator = orchestrator
+        # How often credentials and connections are refreshed, in seconds
+        self.refresh_interval = refresh_interval or int(os.getenv("WARMUP_INTERVAL_SECONDS", "300"))
+        # How long without requests before the cached resources are released, in seconds
+        self.idle_timeout = idle_timeout or int(os.getenv("IDLE_RELEASE_SECONDS", "1800"))
+
+        self._lock = threading.Lock()
+        self._active_requests = 0
+        self._last_activity = time.monotonic()
+        self._is_warm = False
+        self._stop_event = threading.Event()
+        self._thread = None
+
+    def start(self):
+        # Warms up right away, then keeps refreshing in a daemon thread
+        if self._thread is not None:
+            return
+        self._thread = threading.Thread(target=self._run, name="warmup-manager", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    @contextmanager
+    def track_request(self):
+        # Marks a request as in flight, resources are never released while one is running.
+        # Released clients are rebuilt lazily by the agents, so the service is warm again after this.
+        with self._lock:
+            self._active_requests += 1
+            self._last_activity = time.monotonic()
+            self._is_warm = True
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._active_requests -= 1
+                self._last_activity = time.monotonic()
+
+    def _run(self):
+        self._warm_up()
+        while not self._stop_event.wait(self.refresh_interval):
+            with self._lock:
+                idle_for = time.monotonic() - self._last_activity
+                should_release = self._is_warm and self._active_requests == 0 and idle_for >= self.idle_timeout
+                if should_release:
+                    # Released under the lock so no request can start while clients are torn down
+                    self.orchestrator.release()
+                    self._is_warm = False
+                should_refresh = self._is_warm
+
+            if should_refresh:
+                self._warm_up()
+
+    def _warm_up(self):
+        try:
+            self.orchestrator.warm_up()
+            with self._lock:
+                self._is_warm = True
+        except Exception as e:
+            print(f"Warm-up failed. Error: {e}")
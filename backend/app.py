@@ -1,28 +1,13 @@
 import os
-import threading
-import time
-import requests
-from flask import Flask, request, jsonify, send_file, send_from_directory
+import re
+import json
+from flask import Flask, Response, request, jsonify, send_file, send_from_directory, stream_with_context
 from agents.orchestrator import Orchestrator
+from agents.checkpoint_store import JobAlreadyRunningError
+from agents.warmup_manager import WarmupManager
 from flask_cors import CORS
 
-KEEP_ALIVE_URL = "https://billbot-ai.onrender.com"
-PING_INTERVAL = 30 # in seconds
-
-def ping_website():
-    """Sends a GET request to the keep-alive URL."""
-    try:
-        response = requests.get(KEEP_ALIVE_URL)
-        print(f"Keep-alive ping sent to {KEEP_ALIVE_URL}, Status: {response.status_code}")
-    except requests.exceptions.RequestException as e:
-        print(f"Keep-alive ping failed: {e}")
-
-def keep_alive():
-    """Runs the ping function in an infinite loop with a delay."""
-    while True:
-        ping_website()
-        time.sleep(PING_INTERVAL)
-
+JOB_ID_PATTERN = re.compile(r'[a-zA-Z0-9_-]{1,128}')
 
 # Initializing Flask, pointing static to React build
 app = Flask(__name__, static_folder="static", static_url_path="")
@@ -37,12 +22,18 @@ except Exception as e:
     print(f"FATAL: Could not initialize the orchestrator. Error: {e}")
     orchestrator = None
 
+# Keeps credentials and connections warm between requests and frees them when idle
+warmup_manager = None
+if orchestrator:
+    warmup_manager = WarmupManager(orchestrator)
+    warmup_manager.start()
+
 
 # API Endpoints
 @app.route('/process-invoices', methods=['POST'])
 def process_invoices():
     """
-    Main API endpoint. Expects JSON with 'drive_link'.
+    Main API endpoint. Expects JSON with 'drive_link' and an optional 'job_id'.
     """
     if not orchestrator:
         return jsonify({"error": "Orchestrator unavailable due to initialization error."}), 500
@@ -52,10 +43,15 @@ def process_invoices():
         return jsonify({"error": "Missing 'drive_link' in request body"}), 400
     
     drive_link = data['drive_link']
-    print(f"\nReceived new request. Starting workflow for: {drive_link}")
+    job_id = orchestrator.resolve_job_id(drive_link, data.get('job_id'))
+    if not job_id or not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid 'drive_link' or 'job_id'."}), 400
+
+    print(f"\nReceived new request {job_id}. Starting workflow for: {drive_link}")
 
     try:
-        result_path = orchestrator.process_invoices_from_drive(drive_link)
+        with warmup_manager.track_request():
+            result_path = orchestrator.process_invoices_from_drive(drive_link, job_id=job_id)
 
         if result_path and os.path.exists(result_path):
             print(f"Workflow successful. Sending file: {result_path}")
@@ -67,11 +63,96 @@ def process_invoices():
         else:
             print("Workflow finished but no file was generated.")
             return jsonify({"error": "Failed to process invoices or no data was extracted."}), 500
+    except JobAlreadyRunningError as e:
+        print(e)
+        return jsonify({"error": "This job is already being processed. Try again once it finishes."}), 409
     except Exception as e:
         print(f"Unexpected error during workflow: {e}")
         return jsonify({"error": "Internal server error occurred."}), 500
 
 
+@app.route('/process-invoices/stream', methods=['GET'])
+def process_invoices_stream():
+    """
+    Streaming variant of /process-invoices. Expects 'drive_link' (and optionally 'job_id')
+    as query parameters and pushes per-file progress as Server-Sent Events. Every finished
+    file is checkpointed, so the results can be downloaded even if the run is aborted and
+    a rerun of the same job resumes where it stopped.
+    """
+    if not orchestrator:
+        return jsonify({"error": "Orchestrator unavailable due to initialization error."}), 500
+
+    drive_link = request.args.get('drive_link')
+    if not drive_link:
+        return jsonify({"error": "Missing 'drive_link' query parameter"}), 400
+
+    job_id = orchestrator.resolve_job_id(drive_link, request.args.get('job_id'))
+    if not job_id or not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid 'drive_link' or 'job_id'."}), 400
+
+    print(f"\nReceived new streaming request {job_id}. Starting workflow for: {drive_link}")
+
+    # The first event is only produced once the job's lease is taken, so a duplicate run
+    # is refused before the stream starts
+    events = orchestrator.iter_invoice_events(drive_link, job_id=job_id)
+    try:
+        first_event = next(events)
+    except JobAlreadyRunningError as e:
+        print(e)
+        return jsonify({"error": "This job is already being processed. Try again once it finishes."}), 409
+
+    def generate():
+        try:
+            with warmup_manager.track_request():
+                yield _format_sse(first_event.pop("event"), first_event)
+                for event in events:
+                    event_name = event.pop("event")
+                    yield _format_sse(event_name, event)
+        except Exception as e:
+            print(f"Unexpected error during streaming workflow {job_id}: {e}")
+            yield _format_sse("error", {"error": "Internal server error occurred."})
+
+    response = Response(
+        stream_with_context(generate()),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+    # Releases the job's lease even if the stream is closed before it started
+    response.call_on_close(events.close)
+    return response
+
+
+@app.route('/process-invoices/<job_id>/download', methods=['GET'])
+def download_job_results(job_id):
+    """
+    Returns a workbook with every invoice of the job extracted so far, complete or partial.
+    """
+    if not orchestrator:
+        return jsonify({"error": "Orchestrator unavailable due to initialization error."}), 500
+
+    if not JOB_ID_PATTERN.fullmatch(job_id):
+        return jsonify({"error": "Invalid job id."}), 400
+
+    extracted_rows = orchestrator.checkpoint_store.get_extracted_rows(job_id)
+    result_path = orchestrator.excel_agent.create_excel_from_data(
+        extracted_rows,
+        filename=f"Invoices_{job_id}.xlsx"
+    )
+    if not result_path:
+        return jsonify({"error": "No extracted data available for this job yet."}), 404
+
+    return send_file(
+        os.path.abspath(result_path),
+        as_attachment=True,
+        download_name='Invoices_Processed.xlsx'
+    )
+
+
+def _format_sse(event_name, payload):
+    """Serializes a single Server-Sent Event."""
+    return f"event: {event_name}\ndata: {json.dumps(payload, default=str)}\n\n"
+
+
 # React Frontend Routes
 @app.route("/")
 def index():
@@ -86,9 +167,5 @@ def not_found(_):
 
 # Main Entrypoint
 if __name__ == '__main__':
-    keep_alive_thread = threading.Thread(target=keep_alive)
-    keep_alive_thread.daemon = True
-    keep_alive_thread.start()
-    
     # Run the Flask app
     app.run(host='0.0.0.0', port=5000, debug=True)